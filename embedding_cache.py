@@ -0,0 +1,89 @@
+"""
+On-disk cache for text embeddings.
+
+Embeddings are stored in a small SQLite database keyed by a hash of the model
+name and the input text, so re-running an embedding script only calls Vertex AI
+for texts that are new or have changed since the last run.
+"""
+
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+
+class EmbedCache:
+    """Content-addressed SQLite cache of float32 embedding vectors."""
+
+    def __init__(self, path='./.embedcache.sqlite', ttl_seconds=None):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: Location of the SQLite file
+            ttl_seconds: Age after which cached embeddings are recomputed; None keeps them forever
+        """
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, text):
+        """Hash the model name and text into the cache key."""
+        return hashlib.blake2b(f"{model}\0{text}".encode("utf-8"), digest_size=32).hexdigest()
+
+    def get_or_compute_many(self, texts, model, compute_fn):
+        """
+        Return one embedding per text, calling compute_fn only for cache misses.
+
+        Args:
+            texts: List of input texts
+            model: Embedding model name, part of the cache key
+            compute_fn: Called with the list of missing texts; returns their embeddings in order
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        cached = self._get_many(keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if missing:
+            vectors = compute_fn([texts[i] for i in missing])
+            self._put_many([(keys[i], vector) for i, vector in zip(missing, vectors)])
+            cached.update((keys[i], vector) for i, vector in zip(missing, vectors))
+
+        return [cached[key] for key in keys]
+
+    def _get_many(self, keys):
+        """Look up keys and return a dict of key -> embedding list for the unexpired hits."""
+        placeholders = ",".join("?" * len(keys))
+        query = f"SELECT key, vector, created_at FROM embeddings WHERE key IN ({placeholders})"
+        with self._lock:
+            rows = self._conn.execute(query, keys).fetchall()
+
+        now = time.time()
+        return {
+            key: array('f', vector).tolist()
+            for key, vector, created_at in rows
+            if self.ttl_seconds is None or now - created_at < self.ttl_seconds
+        }
+
+    def _put_many(self, items):
+        """Store (key, embedding) pairs, replacing any existing entries."""
+        now = time.time()
+        rows = [
+            (key, array('f', vector).tobytes(), now)
+            for key, vector in items
+            if vector
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def close(self):
+        """Close the database connection."""
+        self._conn.close()
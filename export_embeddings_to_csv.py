@@ -1,6 +1,9 @@
 import os
 import csv
 import neo4j
+import pyarrow as pa
+import pyarrow.parquet as pq
+from itertools import islice
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,6 +14,18 @@ NEO4J_URI = os.getenv('NEO4J_URI')
 NEO4J_USER = os.getenv('NEO4J_USER')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
+# Rows fetched from Neo4j and written to the CSV per batch
+BATCH_SIZE = 1000
+
+# text-embedding-005 vectors are stored as fixed-size float32 lists in Parquet
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS') or 768)
+PARQUET_SCHEMA = pa.schema([
+    ('tmdbId', pa.int64()),
+    ('title', pa.string()),
+    ('overview', pa.string()),
+    ('embedding', pa.list_(pa.float32(), EMBEDDING_DIMENSIONS)),
+])
+
 def export_embeddings_to_csv(output_file='movie_embeddings.csv'):
     """
     Export movie embeddings from Neo4j to a CSV file.
@@ -20,7 +35,7 @@ def export_embeddings_to_csv(output_file='movie_embeddings.csv'):
     driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
     try:
-        with driver.session() as session:
+        with driver.session(fetch_size=BATCH_SIZE) as session:
             # Cypher query to retrieve movie embeddings
             query = """
             MATCH (m:Movie)
@@ -31,20 +46,52 @@ def export_embeddings_to_csv(output_file='movie_embeddings.csv'):
             """
             
             results = session.run(query)
+            rows = (tuple(record.values()) for record in results)
             
-            # Open CSV file for writing
-            with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+            # Open CSV file for writing with a 1MB write buffer
+            with open(output_file, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
                 csvwriter = csv.writer(csvfile)
                 # Write headers
                 csvwriter.writerow(['tmdbId', 'title', 'embedding'])
                 
-                # Write data
-                for record in results:
-                    csvwriter.writerow([
-                        record['tmdbId'], 
-                        record['title'], 
-                        record['embedding']
-                    ])
+                # Write data in batches as the driver streams them
+                for batch in iter(lambda: list(islice(rows, BATCH_SIZE)), []):
+                    csvwriter.writerows(batch)
+            
+            print(f"Embeddings exported to {output_file}")
+
+    finally:
+        driver.close()
+
+def export_embeddings_to_parquet(output_file='movie_embeddings.parquet'):
+    """
+    Export movie embeddings from Neo4j to a Snappy-compressed Parquet file.
+    Embeddings are written as float32 binary rather than JSON text, which keeps
+    the file several times smaller than the CSV export and fast to load.
+    """
+    # Create a Neo4j driver instance
+    driver = neo4j.GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+
+    try:
+        with driver.session(fetch_size=BATCH_SIZE) as session:
+            # Cypher query to retrieve movie embeddings as lists, not strings
+            query = """
+            MATCH (m:Movie)
+            WHERE m.embedding IS NOT NULL
+            RETURN m.tmdbId AS tmdbId, 
+                   m.title AS title, 
+                   m.overview AS overview,
+                   m.embedding AS embedding
+            """
+            
+            results = session.run(query)
+            rows = (tuple(record.values()) for record in results)
+            
+            with pq.ParquetWriter(output_file, PARQUET_SCHEMA, compression='snappy') as writer:
+                # Write one row group per batch as the driver streams them
+                for batch in iter(lambda: list(islice(rows, BATCH_SIZE)), []):
+                    columns = list(zip(*batch))
+                    writer.write_batch(pa.record_batch(columns, schema=PARQUET_SCHEMA))
             
             print(f"Embeddings exported to {output_file}")
 
@@ -52,4 +99,4 @@ def export_embeddings_to_csv(output_file='movie_embeddings.csv'):
         driver.close()
 
 if __name__ == '__main__':
-    export_embeddings_to_csv()
\ No newline at end of file
+    export_embeddings_to_parquet()
\ No newline at end of file
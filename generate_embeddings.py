@@ -1,11 +1,15 @@
 import os
-import numpy as np
 import json
+import queue
 import tempfile
+import threading
 import vertexai
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from langchain_google_vertexai import VertexAI
 from langchain_google_vertexai import VertexAIEmbeddings
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted
 from google.auth import credentials
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
@@ -18,6 +22,7 @@ load_dotenv()
 NEO4J_URI = os.getenv('NEO4J_URI')
 NEO4J_USER = os.getenv('NEO4J_USER')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
+NEO4J_DATABASE = os.getenv('NEO4J_DATABASE') or 'neo4j'
 
 # Initialize Neo4j driver
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
@@ -28,70 +33,215 @@ os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "./service-account.json" #update
 # Initialize Google Cloud AI Platform
 vertexai.init(project=os.getenv("PROJECT_ID"), location=os.getenv("LOCATION"))
 
-# Vertex AI Embedding Model Endpoint
-embeddings = VertexAIEmbeddings(model_name="text-embedding-005")
+# Size of the generated vectors; text-embedding-005 supports down to 256 with a minor quality tradeoff
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS') or 768)
+
+# text-embedding-005 accepts up to 250 inputs and 20K tokens per request
+MAX_BATCH_SIZE = 250
+MIN_BATCH_SIZE = 5
+MAX_BATCH_TOKENS = 20000
+
+# Number of embeddings written back to Neo4j per transaction
+WRITE_BATCH_SIZE = 1000
+
+# Embedding batches are I/O-bound, so several are sent concurrently; the semaphore keeps
+# in-flight Vertex AI requests within the region's quota
+VERTEX_MAX_CONCURRENT_REQUESTS = int(os.getenv('VERTEX_MAX_CONCURRENT_REQUESTS') or 8)
+EMBEDDING_WORKERS = VERTEX_MAX_CONCURRENT_REQUESTS
+vertex_semaphore = threading.Semaphore(VERTEX_MAX_CONCURRENT_REQUESTS)
+
+# Vertex AI Embedding Model Endpoint; langchain sends requests through its own thread pool
+# (5 threads by default), so it is sized to match the semaphore
+embeddings = VertexAIEmbeddings(
+    model_name="text-embedding-005",
+    request_parallelism=VERTEX_MAX_CONCURRENT_REQUESTS
+)
+
+# Embedded batches allowed to wait for the writer; bounds memory and the work wasted if a write fails
+MAX_PENDING_BATCHES = EMBEDDING_WORKERS * 2
 
 
 # Retrieve movie plots and titles from Neo4j
 def retrieve_movie_plots():
     query = "MATCH (m:Movie) WHERE m.embedding IS NULL RETURN m.tmdbId AS tmdbId, m.title AS title, m.overview AS overview"
-    with driver.session() as session:
+    with driver.session(database=NEO4J_DATABASE) as session:
         results = session.run(query)
         movies = [{"tmdbId": row["tmdbId"], "title": row["title"], "overview": row["overview"]} for row in results]
     return movies
 
-# Generate embeddings for movie plots using Haystack and store them immediately in Neo4j
-def generate_and_store_embeddings(movies):
+# Rough token estimate used to keep each request under the per-batch token cap
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+# Collapse movies sharing the same overview so each distinct text is embedded only once
+def group_by_overview(movies):
+    unique = {}
     for movie in movies:
-        title = movie.get("title", "Unknown Title")  # Fetch the movie title
+        title = movie.get("title", "Unknown Title")
         overview = str(movie.get("overview", ""))  # Ensure the overview is a string, use empty string as default
-        
-        print(f"Generating embedding for movie: {title}")
-        print(f"Overview for {title} movie: {overview}")
 
         # Check if the overview is not empty
         if overview.strip() == "":
             print(f"No overview available for movie: {title}. Skipping embedding generation.")
             continue
-        
+
+        group = unique.setdefault(overview, {"tmdbIds": [], "title": title, "overview": overview})
+        group["tmdbIds"].append(movie["tmdbId"])
+    return list(unique.values())
+
+
+# Group distinct overviews into batches bounded by size and token count
+def batch_movies(movies, batch_size=MAX_BATCH_SIZE, max_tokens=MAX_BATCH_TOKENS):
+    batch = []
+    batch_tokens = 0
+    for movie in group_by_overview(movies):
+        tokens = estimate_tokens(movie["overview"])
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch = []
+            batch_tokens = 0
+
+        batch.append(movie)
+        batch_tokens += tokens
+
+    if batch:
+        yield batch
+
+
+# Embed a batch of overviews in one request, halving the batch when Vertex AI rejects it
+def embed_batch(batch):
+    overviews = [movie["overview"] for movie in batch]
+    try:
+        with vertex_semaphore:
+            return embeddings.embed(
+                overviews,
+                batch_size=len(overviews),
+                embeddings_task_type="RETRIEVAL_DOCUMENT",
+                dimensions=EMBEDDING_DIMENSIONS
+            )
+    except (InvalidArgument, ResourceExhausted) as e:
+        if len(batch) <= MIN_BATCH_SIZE:
+            raise
+        print(f"Batch of {len(batch)} movies rejected ({e}). Retrying in smaller batches.")
+        middle = len(batch) // 2
+        return embed_batch(batch[:middle]) + embed_batch(batch[middle:])
+
+
+# Embed one batch and return the rows to write back to Neo4j
+def embed_rows(batch):
+    print(f"Generating embeddings for {len(batch)} movies")
+
+    try:
+        embedding_results = embed_batch(batch)
+    except Exception as e:
+        print(f"Error generating embeddings for batch starting at movie {batch[0]['title']}: {e}")
+        return []
+
+    rows = []
+    for movie, embedding_result in zip(batch, embedding_results):
+        if embedding_result:
+            rows.append({"ids": movie["tmdbIds"], "emb": embedding_result})
+        else:
+            print(f"Failed to generate embedding for movie: {movie['title']}")
+    return rows
+
+
+# Single writer thread: drain embedded rows from the queue and store them in UNWIND batches
+def write_embeddings(rows_queue):
+    buffer = []
+    with driver.session(database=NEO4J_DATABASE) as session:
+        while True:
+            rows = rows_queue.get()
+            if rows is None:
+                break
+
+            buffer.extend(rows)
+            if len(buffer) >= WRITE_BATCH_SIZE:
+                store_embeddings_in_neo4j(session, buffer)
+                buffer = []
+
+        if buffer:
+            store_embeddings_in_neo4j(session, buffer)
+
+
+# Hand rows to the writer, waiting for room in the queue but re-raising the
+# writer's error as soon as it has stopped
+def put_rows(rows_queue, rows, writer):
+    while True:
+        if writer.done():
+            # The writer only returns after the final None, so it stopped on an error
+            writer.result()
+            raise RuntimeError("Embedding writer stopped before all rows were stored")
+        try:
+            rows_queue.put(rows, timeout=1)
+            return
+        except queue.Full:
+            continue
+
+
+# Generate embeddings for movie plots concurrently and write them back to Neo4j in bulk
+def generate_and_store_embeddings(movies):
+    rows_queue = queue.Queue(maxsize=MAX_PENDING_BATCHES)
+    with ThreadPoolExecutor(max_workers=1) as writer_executor:
+        writer = writer_executor.submit(write_embeddings, rows_queue)
+
         try:
-            # Generate embedding for the current overview (pass overview as a string to the embedder)
-            embedding_result = embeddings.embed_query(overview)  # Pass overview as a string
-            # print(str(embedding_result)[:100])
-            # embedding = embedding_result.get("embedding", None)  # Safely access the embedding from the result
-            
-            if embedding_result:
-                # Store the embedding in Neo4j immediately
-                tmdbId = movie["tmdbId"]
-                store_embedding_in_neo4j(tmdbId, embedding_result)
-            else:
-                print(f"Failed to generate embedding for movie: {title}")
-        except Exception as e:
-            print(f"Error generating embedding for movie {title}: {e}")
-
-
-# Store the embedding in Neo4j
-def store_embedding_in_neo4j(tmdbId, embedding):
+            # Submit batches only while few are pending, so a failed writer stops the run early
+            with ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS) as executor:
+                pending = deque()
+                try:
+                    for batch in batch_movies(movies):
+                        pending.append(executor.submit(embed_rows, batch))
+                        if len(pending) >= MAX_PENDING_BATCHES:
+                            put_rows(rows_queue, pending.popleft().result(), writer)
+                    while pending:
+                        put_rows(rows_queue, pending.popleft().result(), writer)
+                finally:
+                    for future in pending:
+                        future.cancel()
+        finally:
+            # Tell the writer there is nothing more to store
+            if not writer.done():
+                put_rows(rows_queue, None, writer)
+
+        # Wait for the last batch, re-raising any error from the writer
+        writer.result()
+
+
+# Make sure the tmdbId lookups below are index seeks (same constraint as graph_build.py)
+def create_tmdb_id_constraint():
+    query = "CREATE CONSTRAINT unique_tmdb_id IF NOT EXISTS FOR (m:Movie) REQUIRE m.tmdbId IS UNIQUE"
+    with driver.session(database=NEO4J_DATABASE) as session:
+        session.run(query)
+
+
+# Store a batch of embeddings in Neo4j with a single UNWIND transaction,
+# fanning each embedding out to every movie that shares its overview
+def store_embeddings_in_neo4j(session, rows):
     query = """
-    MATCH (m:Movie {tmdbId: $tmdbId})
-    SET m.embedding = $embedding
+    UNWIND $rows AS r
+    UNWIND r.ids AS id
+    MATCH (m:Movie {tmdbId: id})
+    SET m.embedding = r.emb
     """
-    with driver.session() as session:
-        session.run(query, tmdbId=tmdbId, embedding=embedding)
-    print(f"Embedding for movie {tmdbId} successfully stored in Neo4j.")
+    session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+    print(f"Embeddings for {sum(len(row['ids']) for row in rows)} movies successfully stored in Neo4j.")
 
 
 # Verify embeddings stored in Neo4j
 def verify_embeddings():
     query = "MATCH (m:Movie) WHERE m.embedding IS NOT NULL RETURN m.title, m.embedding LIMIT 10"
-    with driver.session() as session:
+    with driver.session(database=NEO4J_DATABASE) as session:
         results = session.run(query)
         for record in results:
-            print(f"Movie: {record['m.title']}, Embedding: {np.array(record['m.embedding'])[:5]}...")  # Print first 5 values
+            print(f"Movie: {record['m.title']}, Embedding: {record['m.embedding'][:5]}...")  # Print first 5 values
 
 
 # Main function to orchestrate the process
 def main():
+    create_tmdb_id_constraint()
+
     # Step 1: Retrieve movie plots from Neo4j
     movies = retrieve_movie_plots()
     if not movies:
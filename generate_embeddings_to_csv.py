@@ -1,10 +1,22 @@
 import os
 import csv
+import argparse
 import json
+import time
+import random
+import threading
 import vertexai
-from langchain_google_vertexai import VertexAIEmbeddings
+import pyarrow as pa
+from collections import deque
+from itertools import islice
+import pyarrow.parquet as pq
+from concurrent.futures import Future, ThreadPoolExecutor
+from google.api_core.exceptions import ResourceExhausted
+from vertexai.language_models import TextEmbeddingModel, TextEmbeddingInput
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
+from tqdm.auto import tqdm
+from embedding_cache import EmbedCache
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +25,7 @@ load_dotenv()
 NEO4J_URI = os.getenv('NEO4J_URI')
 NEO4J_USER = os.getenv('NEO4J_USER')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
+NEO4J_DATABASE = os.getenv('NEO4J_DATABASE') or 'neo4j'
 
 # Initialize Neo4j driver
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
@@ -24,81 +37,275 @@ os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "./service-account.json" #update
 vertexai.init(project=os.getenv("PROJECT_ID"), location=os.getenv("LOCATION"))
 
 # Vertex AI Embedding Model Endpoint
-embeddings = VertexAIEmbeddings(model_name="text-embedding-005")
+EMBEDDING_MODEL = "text-embedding-005"
+model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
 
-def retrieve_all_movies():
+# Overviews are embedded as documents to be retrieved by the app's query embeddings
+EMBEDDING_TASK_TYPE = "RETRIEVAL_DOCUMENT"
+
+# Vector size requested from Vertex AI; must match the app's vector index
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS') or 768)
+
+# Embeddings from earlier runs, so only new or changed overviews call Vertex AI;
+# the task type and size are part of the key, since they change the vectors returned
+cache = EmbedCache("./.embedcache.sqlite")
+CACHE_MODEL_KEY = f"{EMBEDDING_MODEL}/{EMBEDDING_TASK_TYPE}/{EMBEDDING_DIMENSIONS}"
+
+# Overviews some batch is embedding right now, mapped to a future of their embedding, so
+# batches in flight at the same time share one request; entries leave once cached
+in_flight = {}
+in_flight_lock = threading.Lock()
+
+# Overviews embedded per request (text-embedding-005 allows up to 250 inputs and 20K tokens)
+BATCH_SIZE = 32
+
+# Batches in flight at once; bounded to stay within the Vertex AI requests-per-minute quota
+MAX_WORKERS = 8
+
+# Attempts per request when Vertex AI reports the quota is exhausted (429)
+MAX_RETRIES = 5
+
+# Vectors are stored as fixed-size float16 lists in Parquet by default: half the size of
+# float32 with negligible effect on cosine similarity. --float32 keeps full precision
+def parquet_schema(value_type=pa.float16()):
+    return pa.schema([
+        ('tmdbId', pa.int64()),
+        ('title', pa.string()),
+        ('embedding', pa.list_(value_type, EMBEDDING_DIMENSIONS)),
+    ])
+
+def movie_filter(force=False):
+    """Match movies with an overview; unless force is set, only those still missing an embedding."""
     query = """
     MATCH (m:Movie) 
     WHERE m.overview IS NOT NULL 
     AND m.overview <> ''
+    """
+    if not force:
+        query += "AND m.embedding IS NULL\n"
+    return query
+
+def count_movies(force=False):
+    with driver.session(database=NEO4J_DATABASE) as session:
+        return session.run(movie_filter(force) + "RETURN count(m) AS count").single()["count"]
+
+def iter_movies(force=False):
+    """Stream movies from Neo4j in fetch_size windows instead of materializing them all."""
+    query = movie_filter(force) + """
     RETURN m.tmdbId AS tmdbId, 
            m.title AS title, 
            m.overview AS overview
     """
     
-    with driver.session() as session:
-        results = session.run(query)
-        movies = [
-            {
+    with driver.session(database=NEO4J_DATABASE, fetch_size=1000) as session:
+        for row in session.run(query):
+            yield {
                 "tmdbId": row["tmdbId"], 
                 "title": row["title"], 
                 "overview": row["overview"]
-            } for row in results
-        ]
-    return movies
-
-def generate_embeddings_to_csv(output_file='movie_embeddings.csv'):
-    # Retrieve all movies
-    movies = retrieve_all_movies()
-    print(f"Total movies to process: {len(movies)}")
+            }
+
+def embed_with_retry(texts):
+    """Embed texts in one request, backing off exponentially while the quota is exhausted."""
+    # Small jitter so concurrent workers don't hit Vertex AI in lockstep
+    time.sleep(random.uniform(0, 0.05))
+    for attempt in range(MAX_RETRIES):
+        try:
+            # auto_truncate cuts overlong overviews to the model's input limit instead of failing
+            inputs = [TextEmbeddingInput(text, task_type=EMBEDDING_TASK_TYPE) for text in texts]
+            results = model.get_embeddings(
+                inputs,
+                auto_truncate=True,
+                output_dimensionality=EMBEDDING_DIMENSIONS
+            )
+            return [embedding.values for embedding in results]
+        except ResourceExhausted:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt + random.uniform(0, 1))
+
+def embed_batch(chunk):
+    """
+    Embed a batch of overviews with a single request and return (overview, embedding) pairs.
+    If the batch request fails, fall back to embedding each overview on its own so that
+    one bad overview does not lose the whole batch.
+    """
+    try:
+        vectors = cache.get_or_compute_many(chunk, CACHE_MODEL_KEY, embed_with_retry)
+        return list(zip(chunk, vectors))
+    except Exception as e:
+        tqdm.write(f"Batch request failed ({e}), retrying overviews individually")
+    
+    results = []
+    for overview in chunk:
+        try:
+            results.append((overview, cache.get_or_compute_many([overview], CACHE_MODEL_KEY, embed_with_retry)[0]))
+        except Exception as e:
+            tqdm.write(f"Error processing overview '{overview[:50]}...': {e}")
+            results.append((overview, None))
+    return results
+
+def embed_chunk(chunk):
+    """
+    Embed each distinct overview in a chunk of movies once and return (movie, embedding)
+    pairs in the chunk's order. Overviews another batch is already embedding are waited
+    on rather than requested again.
+    """
+    # Whitespace-only differences between overviews collapse together
+    overviews = [movie['overview'].strip() for movie in chunk]
+    
+    # Claim the overviews no other batch is working on; a claiming batch resolves its
+    # own futures before waiting on anyone else's, so batches never wait on each other in a cycle
+    futures, claimed = {}, {}
+    with in_flight_lock:
+        for overview in dict.fromkeys(overviews):
+            if overview in in_flight:
+                futures[overview] = in_flight[overview]
+            else:
+                futures[overview] = claimed[overview] = in_flight[overview] = Future()
     
-    # Open file in write mode to overwrite any existing file
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+    try:
+        if claimed:
+            for overview, embedding in embed_batch(list(claimed)):
+                claimed[overview].set_result(embedding)
+    finally:
+        # By now the embeddings are in the on-disk cache, which serves later batches
+        with in_flight_lock:
+            for overview, future in claimed.items():
+                if not future.done():
+                    future.set_result(None)
+                del in_flight[overview]
+    
+    # Fan each embedding back out to every movie sharing the overview
+    pairs = []
+    for movie, overview in zip(chunk, overviews):
+        embedding = futures[overview].result()
+        if embedding:
+            pairs.append((movie, embedding))
+        else:
+            tqdm.write(f"Failed to generate embedding for: {movie['title']}")
+    return pairs
+
+def bounded_map(executor, fn, iterable, max_in_flight):
+    """Like executor.map, but only pulls from iterable while fewer than max_in_flight calls are pending."""
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def embed_movies(movies):
+    """
+    Embed movies as they stream in and yield a list of (movie, embedding) pairs per batch.
+    Movies whose embedding failed are reported and left out. Overviews repeated across
+    batches are shared with the batch embedding them or served from the on-disk cache
+    rather than embedded again.
+    """
+    movies = iter(movies)
+    chunks = iter(lambda: list(islice(movies, BATCH_SIZE)), [])
+    
+    # Up to MAX_WORKERS embedding requests in flight; results are yielded in
+    # submission order, so the output is deterministic
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        yield from bounded_map(executor, embed_chunk, chunks, MAX_WORKERS * 2)
+
+def progress_bar(total_count):
+    """Progress bar over embedded movies, redrawn at most once a second."""
+    return tqdm(total=total_count, unit="movie", miniters=100, mininterval=1.0)
+
+def print_summary(total_count, processed_count):
+    print("\nProcessing Complete:")
+    print(f"Total movies processed: {processed_count}")
+    print(f"Total movies failed: {total_count - processed_count}")
+
+def generate_embeddings_to_csv(output_file='movie_embeddings.csv', force=False):
+    # Stream movies from Neo4j
+    total_count = count_movies(force)
+    print(f"Total movies to process: {total_count}")
+    movies = iter_movies(force)
+    
+    # Open file in write mode to overwrite any existing file, with a 1MB write buffer
+    with open(output_file, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile, \
+            progress_bar(total_count) as pbar:
         csvwriter = csv.writer(csvfile)
         
         # Write headers
-        csvwriter.writerow(['tmdbId', 'title', 'overview', 'embedding'])
+        csvwriter.writerow(['tmdbId', 'title', 'embedding'])
         
-        # Tracking variables
         processed_count = 0
-        failed_count = 0
+        for pairs in embed_movies(movies):
+            # Write the whole batch to CSV
+            csvwriter.writerows([
+                movie['tmdbId'], 
+                movie['title'], 
+                json.dumps(embedding)
+            ] for movie, embedding in pairs)
+            processed_count += len(pairs)
+            pbar.update(len(pairs))
         
-        # Process each movie
-        for movie in movies:
-            try:
-                # Generate embedding
-                embedding = embeddings.embed_query(movie['overview'])
-                
-                if embedding:
-                    # Write to CSV
-                    csvwriter.writerow([
-                        movie['tmdbId'], 
-                        movie['title'], 
-                        movie['overview'], 
-                        json.dumps(embedding)
-                    ])
-                    
-                    processed_count += 1
-                    
-                    # Print progress
-                    if processed_count % 100 == 0:
-                        print(f"Processed {processed_count} movies...")
-                        csvfile.flush()  # Ensure data is written to disk
-                else:
-                    failed_count += 1
-                    print(f"Failed to generate embedding for: {movie['title']}")
+        # Ensure data is written to disk once, at the end
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+    
+    print_summary(total_count, processed_count)
+
+def generate_embeddings_to_parquet(output_file='movie_embeddings.parquet', force=False, float32=False):
+    """
+    Generate embeddings into a zstd-compressed Parquet file with float16 (or, with
+    float32 set, float32) vectors, several times smaller and faster to load than
+    JSON-encoded floats in CSV.
+    """
+    schema = parquet_schema(pa.float32() if float32 else pa.float16())
+
+    # Stream movies from Neo4j
+    total_count = count_movies(force)
+    print(f"Total movies to process: {total_count}")
+    movies = iter_movies(force)
+    
+    processed_count = 0
+    with pq.ParquetWriter(output_file, schema, compression='zstd') as writer, \
+            progress_bar(total_count) as pbar:
+        for pairs in embed_movies(movies):
+            if not pairs:
+                continue
             
-            except Exception as e:
-                failed_count += 1
-                print(f"Error processing {movie['title']}: {e}")
-        
-        # Final summary
-        print("\nProcessing Complete:")
-        print(f"Total movies processed: {processed_count}")
-        print(f"Total movies failed: {failed_count}")
+            # Vertex AI returns float32-range values; narrow them to the schema's type
+            vectors = pa.array(
+                [embedding for _, embedding in pairs],
+                type=pa.list_(pa.float32(), EMBEDDING_DIMENSIONS)
+            ).cast(schema.field('embedding').type)
+            
+            # Write one record batch per embedding batch
+            writer.write_batch(pa.record_batch([
+                [movie['tmdbId'] for movie, _ in pairs],
+                [movie['title'] for movie, _ in pairs],
+                vectors,
+            ], schema=schema))
+            processed_count += len(pairs)
+            pbar.update(len(pairs))
+    
+    print_summary(total_count, processed_count)
 
 def main():
-    generate_embeddings_to_csv()
+    parser = argparse.ArgumentParser(description="Generate movie embeddings with Vertex AI.")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="re-embed every movie, including those that already have an embedding in Neo4j"
+    )
+    parser.add_argument(
+        "--float32",
+        action="store_true",
+        help="store full-precision float32 vectors instead of float16"
+    )
+    args = parser.parse_args()
+    
+    try:
+        generate_embeddings_to_parquet(force=args.force, float32=args.float32)
+    finally:
+        cache.close()
 
 if __name__ == "__main__":
     main()
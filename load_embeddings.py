@@ -1,24 +1,49 @@
 import os
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
-import warnings
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-warnings.filterwarnings("ignore")
 load_dotenv()
 
+# Rows read from the Parquet file and written per transaction
+PARQUET_BATCH_SIZE = 10_000
+
+# Local output of generate_embeddings_to_csv.py, used in preference to the published CSV
+PARQUET_FILE = 'movie_embeddings.parquet'
+CSV_FILE = 'https://storage.googleapis.com/neo4j-vertexai-codelab/movie_embeddings.csv'
+
 class LoadEmbeddings:
     def __init__(self, uri, user, password, database='neo4j'):
+        # database= is the default database for every session opened on this driver
         self.driver = GraphDatabase.driver(uri, auth=(user, password), database=database)
 
     def close(self):
         self.driver.close()
     
-    def load_embeddings(self, csv_file):
+    def create_tmdb_id_constraint(self):
+        # Make the per-row tmdbId lookups index seeks (same constraint as graph_build.py)
+        # and wait for the backing index to come online before writing
+        with self.driver.session() as session:
+            session.run("CREATE CONSTRAINT unique_tmdb_id IF NOT EXISTS FOR (m:Movie) REQUIRE m.tmdbId IS UNIQUE")
+            session.run("CALL db.awaitIndexes()")
+
+    def load_embeddings(self, path):
+        self.create_tmdb_id_constraint()
+        if path.endswith('.parquet'):
+            self.load_embeddings_from_parquet(path)
+        else:
+            self.load_embeddings_from_csv(path)
+
+    def load_embeddings_from_csv(self, csv_file):
+        # Rows are independent, so the server writes them in parallel transactions
         query = """
         LOAD CSV WITH HEADERS FROM $csvFile AS row
-        WITH row
-        MATCH (m:Movie {tmdbId: toInteger(row.tmdbId)})
-        SET m.embedding = apoc.convert.fromJsonList(row.embedding)
+        CALL (row) {
+            MATCH (m:Movie {tmdbId: toInteger(row.tmdbId)})
+            SET m.embedding = apoc.convert.fromJsonList(row.embedding)
+            RETURN m
+        } IN 8 CONCURRENT TRANSACTIONS OF 5000 ROWS
         RETURN count(m) AS count
         """
         with self.driver.session() as session:
@@ -26,6 +51,33 @@ class LoadEmbeddings:
             count = result.single()["count"]
             print(f"Embeddings loaded from {csv_file}, total embeddings stored: {count}")
 
+    def load_embeddings_from_parquet(self, parquet_file):
+        # Embeddings arrive as typed float lists, so the server does no JSON parsing,
+        # and each batch is split into parallel server-side transactions
+        query = """
+        UNWIND $rows AS r
+        CALL (r) {
+            MATCH (m:Movie {tmdbId: r.id})
+            SET m.embedding = r.e
+            RETURN m
+        } IN 4 CONCURRENT TRANSACTIONS OF 2500 ROWS
+        RETURN count(m) AS count
+        """
+        count = 0
+        with self.driver.session() as session:
+            parquet = pq.ParquetFile(parquet_file)
+            for batch in parquet.iter_batches(batch_size=PARQUET_BATCH_SIZE, columns=['tmdbId', 'embedding']):
+                ids = batch.column('tmdbId').to_pylist()
+                embs = batch.column('embedding')
+                # Widen float16 vectors so the driver sends them as regular floats
+                if pa.types.is_float16(embs.type.value_type):
+                    embs = embs.cast(pa.list_(pa.float32(), embs.type.list_size))
+                embs = embs.to_pylist()
+                rows = [{"id": id_, "e": vec} for id_, vec in zip(ids, embs)]
+                # CALL ... IN TRANSACTIONS must run in an auto-commit transaction
+                count += session.run(query, rows=rows).single()["count"]
+        print(f"Embeddings loaded from {parquet_file}, total embeddings stored: {count}")
+
 def main():
     uri = os.getenv('NEO4J_URI')
     user = os.getenv('NEO4J_USER')
@@ -35,9 +87,9 @@ def main():
     graph = LoadEmbeddings(uri, user, password, database)
 
     # Load embeddings
-    graph.load_embeddings('https://storage.googleapis.com/neo4j-vertexai-codelab/movie_embeddings.csv')
+    graph.load_embeddings(PARQUET_FILE if os.path.exists(PARQUET_FILE) else CSV_FILE)
 
     graph.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,19 @@
+from movie_rag.core import (
+    GeminiService,
+    MovieRecommendationApp,
+    Neo4jDatabase,
+    VectorRecommendationApp,
+    VectorService,
+    get_ontology_from_neo4j,
+    init_vertexai,
+)
+
+__all__ = [
+    "GeminiService",
+    "MovieRecommendationApp",
+    "Neo4jDatabase",
+    "VectorRecommendationApp",
+    "VectorService",
+    "get_ontology_from_neo4j",
+    "init_vertexai",
+]
@@ -0,0 +1,379 @@
+"""
+Shared services behind the movie recommendation front-ends (app.py and chatbot.py).
+
+This module holds the Neo4j, Vertex AI embedding, and Gemini service classes and
+the two recommendation pipelines built on them, so connection pooling, model
+loading, and caching behave the same in both Gradio apps.
+"""
+
+from prompts import (
+    cypher_generation_prompt,
+    summarize_results_prompt
+) 
+
+import os
+import re
+import time
+import hashlib
+import threading
+import vertexai
+from collections import OrderedDict
+from functools import lru_cache
+from vertexai.generative_models import GenerativeModel
+from vertexai.language_models import TextEmbeddingModel, TextEmbeddingInput
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Seconds to reuse the graph ontology before reading the schema again
+ONTOLOGY_TTL = 300
+
+# Size of the text-embedding-005 vectors; must match the vector index and the stored movie embeddings
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS') or 768)
+
+# HNSW build parameters for the vector index; higher values trade build time for query recall
+VECTOR_HNSW_M = int(os.getenv('VECTOR_HNSW_M') or 16)
+VECTOR_HNSW_EF_CONSTRUCTION = int(os.getenv('VECTOR_HNSW_EF_CONSTRUCTION') or 200)
+
+# Matches the opening (```cypher) and closing (```) fences around generated Cypher
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\n?|\n?```$", re.MULTILINE)
+
+# Keys of each recommendation, in the order the vector search query returns them
+RECOMMENDATION_KEYS = ("title", "plot", "released", "tagline", "similarity")
+
+class Neo4jDatabase:
+    """Class to handle Neo4j database operations."""
+    
+    def __init__(self, uri, username, password, database=None):
+        """Initialize Neo4j connection."""
+        self.database = database or "neo4j"
+        self.driver = GraphDatabase.driver(
+            uri,
+            auth=(username, password),
+            max_connection_pool_size=50,
+            connection_acquisition_timeout=30,
+            keep_alive=True
+        )
+        
+    def close(self):
+        """Close the driver connection."""
+        self.driver.close()
+    
+    def setup_vector_index(self):
+        """Set up or load a vector index in Neo4j for the movie embeddings."""
+        with self.driver.session(database=self.database) as session:
+            try:
+                # Check if the vector index already exists
+                check_query = """
+                SHOW VECTOR INDEXES YIELD name
+                WHERE name = 'overview_embeddings'
+                RETURN name
+                """
+                result = session.run(check_query)
+                existing_index = result.single()
+
+                if existing_index:
+                    print("Vector index 'overview_embeddings' already exists. No need to create a new one.")
+                else:
+                    self._create_vector_index(session)
+            except Exception as e:
+                print(f"Error while setting up vector index: {e}")
+    
+    def rebuild_vector_index(self):
+        """
+        Drop and recreate the vector index, e.g. after changing its dimensions or similarity function.
+        
+        This forces Neo4j to re-index every movie embedding, so it is never run automatically.
+        """
+        with self.driver.session(database=self.database) as session:
+            session.run("DROP INDEX overview_embeddings IF EXISTS")
+            print("Old index dropped")
+            self._create_vector_index(session)
+    
+    def _create_vector_index(self, session):
+        """Create the vector index on the embedding property."""
+        print("Creating new vector index")
+        query_index = f"""
+        CREATE VECTOR INDEX overview_embeddings IF NOT EXISTS
+        FOR (m:Movie) ON (m.embedding)
+        OPTIONS {{indexConfig: {{
+            `vector.dimensions`: {EMBEDDING_DIMENSIONS},  
+            `vector.similarity_function`: 'cosine',
+            `vector.hnsw.m`: {VECTOR_HNSW_M},
+            `vector.hnsw.ef_construction`: {VECTOR_HNSW_EF_CONSTRUCTION}}}}}
+        """    
+        session.run(query_index)
+        print("Vector index created successfully")
+    
+    def get_movie_recommendations_by_vector(self, user_embedding, top_k=5):
+        """
+        Get movie recommendations from Neo4j using vector similarity search.
+        
+        Args:
+            user_embedding: Vector representation of user query
+            top_k: Number of recommendations to return
+        """
+        # Vector similarity search query using the vector index
+        query = """
+        CALL db.index.vector.queryNodes(
+          'overview_embeddings',
+          $top_k,
+          $embedding
+        ) YIELD node as m, score
+        RETURN m.title AS title, 
+               m.overview AS plot, 
+               m.release_date AS released, 
+               m.tagline AS tagline,
+               score
+        """
+        
+        records, _, _ = self.driver.execute_query(
+            query, 
+            database_=self.database,
+            routing_="r",
+            embedding=user_embedding,
+            top_k=top_k
+        )
+        
+        # Records are tuples in RETURN order, so zip them straight onto the result keys
+        return [dict(zip(RECOMMENDATION_KEYS, record)) for record in records]
+
+# (project, location) pairs vertexai.init has already been called with
+_initialized = set()
+_initialized_lock = threading.Lock()
+
+def init_vertexai(project_id, location):
+    """Initialize the Vertex AI SDK once per (project, location) pair."""
+    with _initialized_lock:
+        if (project_id, location) not in _initialized:
+            vertexai.init(project=project_id, location=location)
+            _initialized.add((project_id, location))
+
+class VectorService:
+    """Class to handle vector embeddings."""
+    
+    def __init__(self, project_id, location):
+        """Initialize VertexAI and load the embedding model once."""
+        # Initialize Vertex AI
+        init_vertexai(project_id, location)
+        self._model = TextEmbeddingModel.from_pretrained("text-embedding-005")
+        # Repeated queries (e.g. the Gradio examples) skip the Vertex AI round trip
+        self._cached_embedding = lru_cache(maxsize=1024)(self._embed_text)
+        
+    def _embed_texts(self, texts):
+        """Call Vertex AI once for a list of texts, embedded as retrieval queries."""
+        # Overviews are stored as RETRIEVAL_DOCUMENT embeddings, so queries use the matching task type
+        inputs = [TextEmbeddingInput(text, task_type="RETRIEVAL_QUERY") for text in texts]
+        return [embedding.values for embedding in self._model.get_embeddings(inputs, output_dimensionality=EMBEDDING_DIMENSIONS)]
+        
+    def _embed_text(self, text):
+        """Call Vertex AI for a single text."""
+        return self._embed_texts([text])[0]
+        
+    def generate_embedding(self, text):
+        """
+        Generate embedding vector for the given text using Vertex AI text-embedding-005.
+        
+        Args:
+            text: A single string, or a list of strings to embed in one request
+        """
+        if isinstance(text, str):
+            # Whitespace differences should not defeat the cache
+            return self._cached_embedding(" ".join(text.split()))
+        return self._embed_texts(list(text))
+
+class GeminiService:
+    """Class to handle Gemini API calls via Vertex AI."""
+    
+    def __init__(self, project_id, location):
+        """Initialize Gemini service with Vertex AI."""
+        # Initialize Vertex AI
+        init_vertexai(project_id, location)
+        
+        # Load the generative model
+        self.model = GenerativeModel("gemini-2.0-flash-001")
+        
+        # LRU cache of prompt hash -> (timestamp, response text)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_size = 512
+        self.cache_ttl = 600
+    
+    @staticmethod
+    def _cache_key(prompt):
+        """Hash a prompt into its cache key."""
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    
+    def generate_response(self, prompt):
+        """Generate a response using Gemini, reusing recent responses to identical prompts."""
+        key = self._cache_key(prompt)
+        now = time.time()
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached and now - cached[0] < self.cache_ttl:
+                self._cache.move_to_end(key)
+                return cached[1]
+        
+        response = self.model.generate_content(prompt)
+        text = response.text
+        
+        with self._cache_lock:
+            self._cache[key] = (now, text)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+    
+    def forget(self, prompt):
+        """Drop the cached response to prompt, so the next call generates a fresh one."""
+        with self._cache_lock:
+            self._cache.pop(self._cache_key(prompt), None)
+
+def get_ontology_from_neo4j(driver, database=None):
+    # Fetch node properties and relationship types in a single round trip
+    query = """
+    CALL {
+        CALL db.schema.nodeTypeProperties() YIELD nodeLabels, propertyName
+        RETURN collect({labels: nodeLabels, prop: propertyName}) AS nodes
+    }
+    CALL {
+        CALL db.relationshipTypes() YIELD relationshipType
+        RETURN collect(relationshipType) AS rels
+    }
+    RETURN nodes, rels
+    """
+    with driver.session(database=database) as session:
+        record = session.run(query).single()
+        
+        nodes = {}
+        for node in record["nodes"]:
+            node_type = ":".join(node["labels"])
+            props = nodes.setdefault(node_type, set())
+            if node["prop"] is not None:
+                props.add(node["prop"])
+        
+        relationships = set(record["rels"])
+
+        # Construct ontology string
+        lines = [f"({node}) has properties: {', '.join(props)}" for node, props in nodes.items()]
+        lines.extend(f"(:Node)-[:{rel}]->(:Node)" for rel in relationships)
+
+        return "\n".join(lines).strip()
+
+
+class MovieRecommendationApp:
+    """Main application class that combines Neo4j and Gemini for movie recommendations."""
+    
+    def __init__(self, neo4j_uri, neo4j_user, neo4j_password, neo4j_database, project_id, location):
+        """Initialize the application with Neo4j and Gemini services."""
+        self.neo4j = Neo4jDatabase(neo4j_uri, neo4j_user, neo4j_password, neo4j_database)
+        self.gemini = GeminiService(project_id, location)
+        self.vector_service = VectorService(project_id, location)
+        
+        # The graph schema rarely changes, so the ontology is refreshed at most every ONTOLOGY_TTL seconds
+        self._ontology = None
+        self._ontology_ts = 0
+    
+    def get_ontology(self):
+        """Return the cached ontology string, refreshing it once it is older than ONTOLOGY_TTL."""
+        if self._ontology is None or time.time() - self._ontology_ts > ONTOLOGY_TTL:
+            self._ontology = get_ontology_from_neo4j(self.neo4j.driver, self.neo4j.database)
+            self._ontology_ts = time.time()
+        return self._ontology
+    
+    def process_query(self, user_input):
+        """Process a user query with vector search followed by LLM-generated Cypher (GraphRAG)."""
+        try:
+            # Step 1: Vector search
+            query_embedding = self.vector_service.generate_embedding(user_input)
+            vector_results = self.neo4j.get_movie_recommendations_by_vector(query_embedding, top_k=5)
+            
+            if not vector_results:
+                return "Sorry, no relevant results found using vector search."
+
+            # Step 2: Format the vector search results as context for the LLM
+            context = "Information from vector search:\n"
+            for i, result in enumerate(vector_results):
+                context += f"[Result {i+1}] Title: {result['title']}\nPlot: {result['plot']}\n\n"
+
+            # Step 3: Generate Cypher query using the context and Gemini
+            ontology = self.get_ontology()
+            cypher_prompt = cypher_generation_prompt(user_input, context, ontology)
+            generated_query = self.gemini.generate_response(cypher_prompt).strip()
+
+            # Remove Markdown code fences (e.g., ```cypher ... ```) if the model added them
+            generated_query = _FENCE_RE.sub("", generated_query).strip()
+            
+            print("Generated Cypher:\n", generated_query)
+
+            # Step 4: Run Cypher query
+            try:
+                with self.neo4j.driver.session(database=self.neo4j.database) as session:
+                    result = session.run(generated_query)
+                    records = [record.data() for record in result]
+            except Exception:
+                # Don't serve the failing Cypher again when the user retries the question
+                self.gemini.forget(cypher_prompt)
+                raise
+            
+            # Step 5: Summarize results
+            summary_prompt = summarize_results_prompt(user_input, {"query": generated_query, "results": records}, len(records), str(records))
+            summary = self.gemini.generate_response(summary_prompt)
+
+            return summary
+
+        except Exception as e:
+            return f"Error processing query: {str(e)}"
+    
+    def close(self):
+        """Close all connections."""
+        self.neo4j.close()
+
+class VectorRecommendationApp(MovieRecommendationApp):
+    """Variant that answers from vector search results only, without generating Cypher."""
+    
+    def process_query(self, user_input):
+        """Process a user query to get movie recommendations using vector search."""
+        try:
+            # Step 1: Generate embedding for user query - using the same model that was used for the movies
+            query_embedding = self.vector_service.generate_embedding(user_input)
+            
+            # Step 2: Get recommendations using vector similarity search
+            recommendations = self.neo4j.get_movie_recommendations_by_vector(query_embedding)
+            
+            # Step 3: Use Gemini to craft a personalized response
+            if recommendations:
+                movies_context = "\n".join([
+                    f"Movie: {rec['title']}\n"
+                    f"Plot: {rec['plot']}\n"
+                    f"Released: {rec['released']}\n"
+                    f"Tagline: {rec['tagline']}\n"
+                    f"Similarity Score: {rec['similarity']:.4f}"
+                    for rec in recommendations
+                ])
+                
+                explanation_prompt = f"""
+                The user asked: "{user_input}"
+                
+                Based on their query, I found these movies (with semantic similarity scores):
+                {movies_context}
+                
+                Create a friendly and helpful response that:
+                1. Acknowledges their request
+                2. Explains why these recommendations match their request (referring to plot elements, themes, etc.)
+                3. Presents the movies in a clear, readable format with titles, release years, and brief descriptions
+                4. Asks if they'd like more specific recommendations
+                
+                Important note: Don't simply list out all the movies with bullet points or numbers. Format it as a conversational response while still highlighting the key information about each movie.
+                """
+                
+                response = self.gemini.generate_response(explanation_prompt)
+            else:
+                response = f"I couldn't find any movies matching '{user_input}'. Our database might not have embeddings for all movies yet. Could you try a different query?"
+            
+            return response
+        
+        except Exception as e:
+            return f"Sorry, I encountered an error: {str(e)}. Please try again."
@@ -1,28 +1,21 @@
 """
 LLM prompts module for movie knowledge graph interactions.
 
-This module contains lambda functions that generate prompts for different
+This module contains functions that generate prompts for different
 language model interactions needed throughout the application, including
-fixing Cypher queries, generating Cypher from natural language, and
-summarizing query results.
+generating Cypher from natural language and summarizing query results.
+Each template is split into its constant fragments once at import time, so
+building a prompt is a single concatenation.
 """
 
-# Prompt for generating Cypher queries from natural language questions
-# Takes a user query, vector search context, and knowledge graph ontology
-# Returns a prompt instructing the LLM how to generate an appropriate Cypher query
-cypher_generation_prompt = lambda query, context, ontology:f"""
-You are an assistant working with a Neo4j movie database.
-
-Here is the ontology of the movie knowledge graph:
-
-{ontology}
-
-QUESTION: {query}
+__all__ = ["cypher_generation_prompt", "summarize_results_prompt"]
 
-Here is some relevant context from a vector search:
-{context}
+# Constant fragments of the Cypher generation prompt, split around ontology, context and query
+_CYPHER_PROMPT_PARTS = (
+    """
+You are an assistant working with a Neo4j movie database.
 
-Your task is to generate a Cypher query using the ontology and context above.
+Your task is to generate a Cypher query using the ontology and context below.
 
 IMPORTANT GUIDELINES FOR CYPHER QUERIES:
 1. Always start with a valid Cypher clause like MATCH, CREATE, MERGE, OPTIONAL, UNWIND, CALL, WITH, RETURN. 
@@ -35,24 +28,50 @@ IMPORTANT GUIDELINES FOR CYPHER QUERIES:
 8. Do not include triple backticks ``` or ```cypher or any additional text except the generated Cypher statement in your response.
 9. Do not use any properties or relationships not included in the schema.
 
+Here is the ontology of the movie knowledge graph:
+
+""",
+    """
+
+Here is some relevant context from a vector search:
+""",
+    """
+
+QUESTION: """,
+    """
+
 Based on this context and the question, generate an appropriate Cypher query to find the answer.
-"""
+""",
+)
 
-# Prompt for summarizing Cypher query results in natural language
-# Takes the original user query, Cypher results, result count, and formatted results
-# Returns a prompt instructing the LLM to generate a human-readable summary
-summarize_results_prompt = lambda query, cypher_results, result_count, formatted_cypher_results: f"""
+# Prompt for generating Cypher queries from natural language questions
+# Takes a user query, vector search context, and knowledge graph ontology
+# Returns a prompt instructing the LLM how to generate an appropriate Cypher query
+# The static instructions and ontology come first and the per-request question and
+# context last, so consecutive prompts share a long prefix for Gemini's implicit cache
+def cypher_generation_prompt(query, context, ontology):
+    head, after_ontology, after_context, tail = _CYPHER_PROMPT_PARTS
+    return "".join((head, ontology, after_ontology, context, after_context, query, tail))
+
+
+# Constant fragments of the summary prompt, split around query, Cypher, count and results
+_SUMMARY_PROMPT_PARTS = (
+    """
 You are a friendly movie assistant helping users find films that match their preferences.
 
-The user asked: "{query}"
+The user asked: \"""",
+    """"
 
 Here’s the Cypher query that was run on the Neo4j movie knowledge graph:
-{cypher_results.get("query", "No query available")}
+""",
+    """
 
-Results found: {result_count}
+Results found: """,
+    """
 
 Results:
-{formatted_cypher_results[:4000] if result_count > 0 else "No results found."}
+""",
+    """
 
 Your task:
 1. Provide a clear, engaging summary of the movies found — write as if you’re a movie enthusiast recommending films to a friend.
@@ -67,4 +86,19 @@ Your task:
    - Offer tips to refine their query for better results next time
 
 Keep the tone conversational and informative — like you're having a chat with someone at a movie club.
-"""
\ No newline at end of file
+""",
+)
+
+# Prompt for summarizing Cypher query results in natural language
+# Takes the original user query, Cypher results, result count, and formatted results
+# Returns a prompt instructing the LLM to generate a human-readable summary
+def summarize_results_prompt(query, cypher_results, result_count, formatted_cypher_results):
+    head, after_query, after_cypher, after_count, tail = _SUMMARY_PROMPT_PARTS
+    results = formatted_cypher_results[:4000] if result_count > 0 else "No results found."
+    return "".join((
+        head, query,
+        after_query, cypher_results.get("query", "No query available"),
+        after_cypher, str(result_count),
+        after_count, results,
+        tail,
+    ))
@@ -1,5 +1,6 @@
 import os
 from neo4j import GraphDatabase
+from neo4j.exceptions import ClientError
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,39 +12,47 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
+def fetch_counts_with_apoc(tx):
+    # Node and relationship counts from the count store in a single round trip
+    result = tx.run("CALL apoc.meta.stats() YIELD labels, relTypesCount RETURN labels, relTypesCount")
+    record = result.single()
+    return record["labels"], record["relTypesCount"]
+
 def fetch_node_counts(tx):
-    query = """
-    CALL db.labels() YIELD label
-    CALL {
-        WITH label
-        RETURN label, count(*) AS count
-        CALL {
-            WITH label
-            RETURN count { MATCH (n:`${label}`) RETURN n } AS count
-        }
-    }
-    RETURN label, count { MATCH (n:`${label}`) RETURN n } AS count
-    """
     result = tx.run("CALL db.labels() YIELD label RETURN label")
     labels = [record["label"] for record in result]
+    counts = {}
     for label in labels:
         count_query = f"MATCH (n:`{label}`) RETURN count(n) AS count"
-        count = tx.run(count_query).single()["count"]
-        print(f"{label}: {count} nodes")
+        counts[label] = tx.run(count_query).single()["count"]
+    return counts
 
 def fetch_relationship_counts(tx):
     result = tx.run("CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType")
     types = [record["relationshipType"] for record in result]
+    counts = {}
     for rel_type in types:
         count_query = f"MATCH ()-[:`{rel_type}`]->() RETURN count(*) AS count"
-        count = tx.run(count_query).single()["count"]
-        print(f"{rel_type}: {count} relationships")
+        counts[rel_type] = tx.run(count_query).single()["count"]
+    return counts
+
+def fetch_counts_without_apoc(tx):
+    # All count queries share one read transaction on the same connection
+    return fetch_node_counts(tx), fetch_relationship_counts(tx)
 
 with driver.session() as session:
+    try:
+        node_counts, relationship_counts = session.execute_read(fetch_counts_with_apoc)
+    except ClientError:
+        # APOC is not installed: count each label and relationship type separately
+        node_counts, relationship_counts = session.execute_read(fetch_counts_without_apoc)
+
     print("\n📦 Node Counts:")
-    session.execute_read(fetch_node_counts)
+    for label, count in node_counts.items():
+        print(f"{label}: {count} nodes")
 
     print("\n🔗 Relationship Counts:")
-    session.execute_read(fetch_relationship_counts)
+    for rel_type, count in relationship_counts.items():
+        print(f"{rel_type}: {count} relationships")
 
 driver.close()